@@ -1,114 +1,295 @@
 import streamlit as st
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+from lxml import etree, html as lxml_html
 from datetime import datetime
-import json
+import orjson
+import hashlib
+import re
+import textwrap
+import threading
 import time
-from typing import List, Dict
+import diskcache
+from cachetools import TTLCache
+from types import MappingProxyType
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+from typing import Callable, List, Dict, Optional, Tuple
 from groq import Groq
 
+DUCKDUCKGO_LITE_URL = "https://lite.duckduckgo.com/lite"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+# Read-only view so the shared defaults can't be mutated per call
+DEFAULT_HEADERS = MappingProxyType({
+    "User-Agent": USER_AGENT,
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+    # gzip/deflate plus br (and zstd) whenever urllib3 can decode them, i.e. brotli is installed
+    "Accept-Encoding": ACCEPT_ENCODING,
+    "Connection": "keep-alive",
+    "DNT": "1",
+    "Upgrade-Insecure-Requests": "1"
+})
+MAX_CONCURRENT_FETCHES = 8  # Upper bound on result pages fetched at once
+MIN_HOST_INTERVAL = 1.0  # Seconds between fetch starts to the same host, to stay polite per origin
+HOST_SCHEDULE_SIZE = 1024  # Hosts whose next allowed fetch start is remembered
+HOST_SCHEDULE_TTL = 60  # Seconds a host's schedule entry is kept; well past any pending start
+VALIDATE_AFTER_RESULTS = 3  # Pages with content needed before the Groq call starts; the rest overlap with it
+STREAM_UPDATE_CHARS = 200  # New response characters between streamed UI updates
+MAX_PAGE_BYTES = 200_000  # Cap on HTML read per page; leaves room for heavy <head> sections before the text
+MAX_CONTENT_CHARS = 5000  # Extracted text kept per page
+SEARCH_CACHE_SIZE = 128  # Max validated searches kept in memory (LRU eviction)
+SEARCH_CACHE_TTL = 600  # Seconds before a cached search is redone; keeps news-style answers fresh
+PAGE_CACHE_DIR = "./.page_cache"
+PAGE_CACHE_TTL = 86400  # Seconds before cached page content is refetched
+PAGE_MEMORY_CACHE_SIZE = 512  # Hot page contents kept in memory in front of the disk cache
+PAGE_MEMORY_CACHE_TTL = 3600
+
+# Page extraction: main content containers in order of preference ("tag" or "tag.class"),
+# the text-bearing tags to keep and the boilerplate tags removed before extraction
+MAIN_CONTENT_SELECTORS = ("main", "article", "div.content", "div.main", "div.article", "div.post", "body")
+CONTENT_TAGS = ("p", "h1", "h2", "h3", "h4", "h5", "h6")
+STRIP_TAGS = ("script", "style", "nav", "footer", "header", "aside")
+
+
+def _selector_xpath(selector: str) -> str:
+    """Translate a "tag" or "tag.class" selector to an XPath expression matching it anywhere."""
+    tag, _, css_class = selector.partition(".")
+    predicate = f"[contains(concat(' ', normalize-space(@class), ' '), ' {css_class} ')]" if css_class else ""
+    return f"//{tag}{predicate}"
+
+
+_MAIN_CONTENT_XPATHS = tuple(etree.XPath(f"({_selector_xpath(selector)})[1]") for selector in MAIN_CONTENT_SELECTORS)
+_CONTENT_XPATH = etree.XPath(".//*[{}]".format(" or ".join(f"self::{tag}" for tag in CONTENT_TAGS)))
+
+# DuckDuckGo Lite result anchors, with any link on the page as a fallback
+_RESULT_LINK_XPATH = etree.XPath(_selector_xpath("a.result-link"))
+_ANY_LINK_XPATH = etree.XPath("//a[@href]")
+_RANGE_HEADERS = MappingProxyType({"Range": f"bytes=0-{MAX_PAGE_BYTES - 1}"})
+
+# Dedented up front so indentation isn't sent (and billed) as prompt tokens
+VALIDATION_PROMPT = textwrap.dedent("""\
+    Query: {query}
+
+    Context from multiple sources:
+    {context}
+
+    Please analyze the above information and provide:
+    1. A summary of the key findings
+    2. Validation of the information across sources
+    3. Any inconsistencies or contradictions
+    4. List of reliable reference links
+
+    Respond with only a JSON object, without any other text, using the following structure:
+    {{
+        "summary": "key findings",
+        "validation": "analysis of information validity",
+        "inconsistencies": ["list of any contradictions"],
+        "references": ["list of verified urls"]
+    }}
+    """)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
 class SearchValidationSystem:
     def __init__(self):
         """Initialize the system with Groq API key directly."""
         self.groq_client = Groq(api_key="YOUR_GROQ_API_KEY")  # Replace with your Groq API key
-        self.search_results_cache = {}
-
-    def fetch_duckduckgo_lite_results(self, query: str, num_results: int = 5) -> List[Dict]:
-        """Fetch search results from DuckDuckGo Lite."""
-        url = "https://lite.duckduckgo.com/lite"
-        results = []
-        
-        # Setting headers to simulate a browser request
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
+        self.search_results_cache = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+        self._search_cache_lock = threading.Lock()  # Instance is shared by all Streamlit sessions
+        self.page_cache = diskcache.Cache(PAGE_CACHE_DIR)  # Persists across app restarts
+        self.page_memory_cache = TTLCache(maxsize=PAGE_MEMORY_CACHE_SIZE, ttl=PAGE_MEMORY_CACHE_TTL)
+        self._page_memory_lock = threading.Lock()  # Written from the fetch pool threads
+
+        # Long-lived page-fetch pool plus per-host pacing, so different hosts are fetched in parallel.
+        # Pacing schedules each host's next allowed start time instead of sleeping in a worker;
+        # entries only matter until that time passes, so the map is bounded and expires.
+        self._fetch_pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_FETCHES, thread_name_prefix="page-fetch")
+        self._host_next_start = TTLCache(maxsize=HOST_SCHEDULE_SIZE, ttl=HOST_SCHEDULE_TTL)
+        self._host_schedule_lock = threading.Lock()
+
+        # Shared HTTP session so connections (and TLS handshakes) are pooled and reused
+        self.http = requests.Session()
+        # One pool per recent host; per-host size matches the most fetches that can run at once
+        adapter = HTTPAdapter(
+            pool_connections=20,
+            pool_maxsize=MAX_CONCURRENT_FETCHES,
+            max_retries=Retry(total=2, backoff_factor=0.3)
+        )
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+        self.http.headers.update(DEFAULT_HEADERS)
+
+    def _search_duckduckgo_lite(self, query: str, num_results: int = 5) -> List[Tuple[str, str]]:
+        """Submit the query to DuckDuckGo Lite and return (title, url) pairs for the top results."""
+        entries = []
 
         try:
             # Submit the search form
-            response = requests.post(url, headers=headers, data={'q': query})
+            response = self.http.post(DUCKDUCKGO_LITE_URL, data={'q': query})
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
+            # Parse the raw bytes with lxml, trusting a charset only when the server declared one
+            declared = "charset" in response.headers.get("Content-Type", "").lower()
+            parser = lxml_html.HTMLParser(encoding=response.encoding) if declared else None
+            root = lxml_html.fromstring(response.content, parser=parser)
 
-            # Locate search result elements
-            links = soup.find_all('a', limit=num_results)
-            
+            # Locate search result elements, preferring DuckDuckGo Lite's result anchors
+            links = _RESULT_LINK_XPATH(root) or _ANY_LINK_XPATH(root)
+
+            # Filter out invalid, duplicate and DuckDuckGo's own links before anything is fetched
+            seen = set()
             for link in links:
-                title = link.get_text(strip=True)
                 result_url = link.get('href')
-                
-                # Only add valid links
-                if result_url and title:
-                    # Fetch and parse content for each link
-                    content = self._fetch_page_content(result_url)
-                    results.append({
-                        'url': result_url,
-                        'title': title,
-                        'description': content[:150] + "...",  # Shorten description for display
-                        'timestamp': datetime.now().isoformat()
-                    })
-
-                # Add a delay to avoid triggering anti-bot measures
-                time.sleep(1)
+                if not result_url or not result_url.startswith(('http://', 'https://')) or result_url in seen:
+                    continue
+                if urlparse(result_url).netloc.endswith('duckduckgo.com'):
+                    continue
+                title = link.text_content().strip()
+                if not title:
+                    continue
+                seen.add(result_url)
+                entries.append((title, result_url))
+                if len(entries) >= num_results:
+                    break
 
         except Exception as e:
             print(f"Error in DuckDuckGo Lite search: {e}")
 
-        return results
+        return entries
+
+    @staticmethod
+    def _make_result(title: str, url: str, content: str, timestamp: str) -> Dict:
+        """Build a search result entry from a fetched page; `timestamp` is shared by the whole batch."""
+        return {
+            'url': url,
+            'title': title,
+            'description': content[:150] + "...",  # Shorten description for display
+            'timestamp': timestamp
+        }
+
+    def _submit_page_fetch(self, url: str) -> Future:
+        """Schedule `_fetch_page_content` for a URL, respecting MIN_HOST_INTERVAL per host."""
+        cached = self._cached_page_content(url)
+        if cached is not None:
+            future = Future()
+            future.set_result(cached)
+            return future
+
+        host = urlparse(url).netloc
+        with self._host_schedule_lock:
+            now = time.monotonic()
+            start = max(now, self._host_next_start.get(host, 0.0))
+            self._host_next_start[host] = start + MIN_HOST_INTERVAL
+        delay = start - now
+        if delay <= 0:
+            return self._fetch_pool.submit(self._fetch_page_content, url)
+
+        # Hand the fetch to the pool only once the host's slot comes up, so no worker sits idle
+        future = Future()
+
+        def relay(done: Future) -> None:
+            if done.exception() is not None:
+                future.set_exception(done.exception())
+            else:
+                future.set_result(done.result())
+
+        def dispatch() -> None:
+            self._fetch_pool.submit(self._fetch_page_content, url).add_done_callback(relay)
+
+        timer = threading.Timer(delay, dispatch)
+        timer.daemon = True
+        timer.start()
+        return future
+
+    def _cached_page_content(self, url: str) -> Optional[str]:
+        """Return page content from the memory or on-disk cache, or None on a miss."""
+        with self._page_memory_lock:
+            cached = self.page_memory_cache.get(url)
+        if cached is not None:
+            return cached
+
+        cached = self.page_cache.get(hashlib.sha256(url.encode()).hexdigest())
+        if cached is not None:
+            with self._page_memory_lock:
+                self.page_memory_cache[url] = cached
+        return cached
 
     def _fetch_page_content(self, url: str) -> str:
-        """Fetch and parse content from a webpage."""
+        """Fetch and parse content from a webpage, using the memory and on-disk caches when possible."""
+        cached = self._cached_page_content(url)
+        if cached is not None:
+            return cached
+
+        content = self._download_page_content(url)
+        # Only cache successful extractions so transient failures are retried
+        if content:
+            self.page_cache.set(hashlib.sha256(url.encode()).hexdigest(), content, expire=PAGE_CACHE_TTL)
+            with self._page_memory_lock:
+                self.page_memory_cache[url] = content
+        return content
+
+    def _download_page_content(self, url: str) -> str:
+        """Download a webpage and extract its main text content."""
         try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
+            # Stream the body and stop once enough HTML has arrived to fill the content limit
+            buf = bytearray()
+            with self.http.get(url, timeout=10, stream=True, headers=_RANGE_HEADERS) as response:
+                response.raise_for_status()
+                # Skip PDFs, images and other bodies we can't extract text from, before reading them
+                content_type = response.headers.get("Content-Type", "").lower()
+                if content_type and "html" not in content_type:
+                    return ""
+                for chunk in response.iter_content(chunk_size=16384):
+                    buf.extend(chunk)
+                    if len(buf) >= MAX_PAGE_BYTES:
+                        break
 
-            soup = BeautifulSoup(response.text, 'html.parser')
-            for element in soup(['script', 'style', 'nav', 'footer', 'header']):  # Clean unnecessary content
-                element.decompose()
+            # Parse the raw bytes with lxml, trusting a charset only when the server declared one;
+            # otherwise libxml2 falls back to Latin-1 for pages without a <meta charset>
+            declared = "charset" in response.headers.get("Content-Type", "").lower()
+            parser = lxml_html.HTMLParser(encoding=response.encoding) if declared else None
+            root = lxml_html.fromstring(bytes(buf[:MAX_PAGE_BYTES]), parser=parser)
+            # Drop boilerplate subtrees in one C-level walk before looking for content
+            etree.strip_elements(root, *STRIP_TAGS, with_tail=False)
 
-            main_content = soup.find('main') or soup.find('article') or soup.find('body')
-            if main_content:
-                paragraphs = main_content.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
-                content = ' '.join(p.get_text(strip=True) for p in paragraphs)
-                return content[:5000]
-            return ""
+            # Prefer the main content area, falling back to the whole body
+            for xpath in _MAIN_CONTENT_XPATHS:
+                matches = xpath(root)
+                if matches:
+                    main_content = matches[0]
+                    break
+            else:
+                return ""
+
+            # Single XPath pass for paragraphs and headings, stopping once the content limit is reached
+            parts = []
+            length = 0
+            for node in _CONTENT_XPATH(main_content):
+                text = node.text_content().strip()
+                parts.append(text)
+                length += len(text) + 1
+                if length >= MAX_CONTENT_CHARS:
+                    break
+            return ' '.join(parts)[:MAX_CONTENT_CHARS]
 
         except Exception as e:
             print(f"Error fetching page content from {url}: {e}")
             return ""
 
-    def validate_with_llama(self, query: str, search_results: List[Dict]) -> Dict:
-        """Validate search results using LLaMA through Groq."""
+    def validate_with_llama(self, query: str, search_results: List[Dict],
+                            on_token: Optional[Callable[[str], None]] = None) -> Dict:
+        """Validate search results using LLaMA through Groq, periodically streaming the partial response to `on_token`."""
         # Check if the search results contain content
         if not search_results:
-            return {"error": "No valid search results to analyze"}
+            return self._validation_error("No valid search results to analyze")
 
-        # Prepare context from search results
-        context = "\n".join([f"Source {i+1} ({result['url']}):\nTitle: {result['title']}\nDescription: {result['description']}\nContent: {result['description'][:200]}..."
+        # Prepare context from search results; the description already holds the page text excerpt
+        context = "\n".join([f"Source {i+1} ({result['url']}):\nTitle: {result['title']}\nContent: {result['description']}"
                             for i, result in enumerate(search_results)])
 
-        prompt = f"""
-        Query: {query}
-        
-        Context from multiple sources:
-        {context}
-        
-        Please analyze the above information and provide:
-        1. A summary of the key findings
-        2. Validation of the information across sources
-        3. Any inconsistencies or contradictions
-        4. List of reliable reference links
-        
-        Format your response as JSON with the following structure:
-        {{
-            "summary": "key findings",
-            "validation": "analysis of information validity",
-            "inconsistencies": ["list of any contradictions"],
-            "references": ["list of verified urls"]
-        }}
-        """
+        prompt = VALIDATION_PROMPT.format(query=query, context=context)
 
         try:
             response = self.groq_client.chat.completions.create(
@@ -118,52 +299,140 @@ class SearchValidationSystem:
                 }],
                 model="llama-3.1-8b-instant",
                 temperature=0.3,
-                response_format={"type": "json_object"},
-                max_tokens=2048
+                max_tokens=2048,
+                # Groq's JSON mode doesn't support streaming, so the JSON shape is requested in the prompt
+                stream=True
             )
-            content = response.choices[0].message.content
-            return json.loads(content) if content else {"error": "Empty response from LLaMA"}
+            # Forward the partial text in batches; every callback is a round-trip to the browser
+            tokens = []
+            pending = 0
+            for chunk in response:
+                token = chunk.choices[0].delta.content if chunk.choices else None
+                if token:
+                    tokens.append(token)
+                    pending += len(token)
+                    if on_token and pending >= STREAM_UPDATE_CHARS:
+                        on_token("".join(tokens))
+                        pending = 0
+            content = "".join(tokens)
+            if not content:
+                return self._validation_error("Empty response from LLaMA")
+
+            # Without JSON mode the model may wrap the object in prose or code fences
+            start, end = content.find("{"), content.rfind("}")
+            if 0 <= start < end:
+                content = content[start:end + 1]
+            return self._coerce_validation(orjson.loads(content))
+
+        except ValueError as e:
+            # No JSON mode while streaming, so the model can return invalid, cut-off (max_tokens)
+            # or wrongly shaped JSON; orjson.JSONDecodeError is a ValueError too
+            print(f"Malformed JSON from LLaMA: {e}")
+            return self._validation_error(f"LLaMA returned malformed JSON: {e}")
 
         except Exception as e:
             print(f"Error in LLaMA validation: {e}")
-            return {
-                "summary": "Error in validation process",
-                "validation": str(e),
-                "inconsistencies": [],
-                "references": []
-            }
-
-    def search_and_validate(self, query: str) -> Dict:
+            return self._validation_error(str(e))
+
+    @staticmethod
+    def _validation_error(message: str) -> Dict:
+        """Build a validation entry reporting `message`, in the shape `main` renders."""
+        return {
+            "summary": "Error in validation process",
+            "validation": message,
+            "inconsistencies": [],
+            "references": []
+        }
+
+    @staticmethod
+    def _coerce_validation(data) -> Dict:
+        """Coerce the parsed LLaMA response to the summary/validation/inconsistencies/references shape."""
+        if not isinstance(data, dict):
+            raise ValueError(f"expected a JSON object, got {type(data).__name__}")
+
+        def as_list(value) -> List[str]:
+            if isinstance(value, list):
+                return [str(item) for item in value if item]
+            return [str(value)] if value else []
+
+        return {
+            "summary": str(data.get("summary") or ""),
+            "validation": str(data.get("validation") or ""),
+            "inconsistencies": as_list(data.get("inconsistencies")),
+            "references": as_list(data.get("references"))
+        }
+
+    @staticmethod
+    def _query_cache_key(query: str) -> str:
+        """Build a cache key that ignores case, extra whitespace and trailing sentence punctuation."""
+        # Inner punctuation is kept: "C++ jobs" and "C jobs" are different searches
+        normalized = _WHITESPACE_RE.sub(" ", query.lower()).strip()
+        normalized = normalized.rstrip("?!.").rstrip()
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
+    def search_and_validate(self, query: str, on_token: Optional[Callable[[str], None]] = None) -> Dict:
         """Main method to perform search and validation."""
-        # Check cache first
-        if query in self.search_results_cache:
+        # Check cache first, keyed on the normalized query so trivial variations still hit
+        cache_key = self._query_cache_key(query)
+        with self._search_cache_lock:
+            cached = self.search_results_cache.get(cache_key)
+        if cached is not None:
             print("Using cached results...")
-            return self.search_results_cache[query]
+            return cached
 
         # Fetch new results
-        search_results = self.fetch_duckduckgo_lite_results(query)
-        if not search_results:
+        entries = self._search_duckduckgo_lite(query)
+        if not entries:
             return {"error": "No search results found"}
 
+        timestamp = datetime.now().isoformat()
+        futures = [self._submit_page_fetch(url) for _, url in entries]
+
+        # Start validating once the first few pages with content are in, while the rest keep
+        # downloading. Failed or non-HTML pages finish fastest, so they don't count; if too few
+        # pages have content this simply waits for all of them.
+        with_content = 0
+        for future in as_completed(futures):
+            if future.result():
+                with_content += 1
+                if with_content >= VALIDATE_AFTER_RESULTS:
+                    break
+        early_results = [self._make_result(title, url, future.result(), timestamp)
+                         for (title, url), future in zip(entries, futures)
+                         if future.done() and future.result()]
+        if not early_results:
+            return {"error": "Could not fetch content from any search result"}
+
         # Validate with LLaMA
-        validation_results = self.validate_with_llama(query, search_results)
-        
+        validation_results = self.validate_with_llama(query, early_results, on_token)
+
+        # Pages that finished after validation started are still shown, just not validated
+        search_results = [self._make_result(title, url, future.result(), timestamp)
+                          for (title, url), future in zip(entries, futures)]
+
         # Combine results
         final_results = {
             "query": query,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": timestamp,
             "search_results": search_results,
             "validation": validation_results
         }
 
         # Cache results
-        self.search_results_cache[query] = final_results
+        with self._search_cache_lock:
+            self.search_results_cache[cache_key] = final_results
         return final_results
 
 
+@st.cache_resource
+def get_system() -> SearchValidationSystem:
+    """Create the search system once and share it across Streamlit reruns."""
+    return SearchValidationSystem()
+
+
 def main():
-    # Initialize Streamlit app UI
-    system = SearchValidationSystem()
+    # Initialize Streamlit app UI; the system (HTTP pool, Groq client, caches) survives reruns
+    system = get_system()
 
     st.title("Search and Validation System")
     query = st.text_input("Enter search query:", value="US Election 2024")
@@ -172,7 +441,12 @@ def main():
         if not query:
             st.error("Please enter a search query.")
         else:
-            results = system.search_and_validate(query)
+            # Show the LLaMA response as it streams in, then clear it for the formatted results
+            stream_placeholder = st.empty()
+            results = system.search_and_validate(
+                query, on_token=lambda text: stream_placeholder.code(text, language="json")
+            )
+            stream_placeholder.empty()
 
             if "error" in results:
                 st.error(results["error"])